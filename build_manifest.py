@@ -0,0 +1,32 @@
+import hashlib
+import os
+
+
+class BuildManifest:
+    """
+    Content hashes of the files written by a build, keyed by URL relative to
+    the output dir. Build stages record files as they write them, so later
+    stages (e.g. the service worker precache list) never rescan the output.
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.file_hashes: dict[str, str] = {}
+        # Static files (e.g. "static/style.css") linked from the output
+        self.referenced_asset_paths: set[str] = set()
+
+    def _url(self, path: str) -> str:
+        return os.path.relpath(path, self.output_dir).replace(os.sep, "/")
+
+    def record(self, path: str, sha256: str) -> None:
+        self.file_hashes[self._url(path)] = sha256
+
+    def remove(self, path: str) -> None:
+        os.remove(path)
+        self.file_hashes.pop(self._url(path), None)
+
+    def write_text(self, path: str, text: str) -> None:
+        content = text.encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(content)
+        self.record(path, hashlib.sha256(content).hexdigest())
@@ -0,0 +1,138 @@
+import collections
+import random
+import sys
+import zlib
+
+from main import INPUT_DIR, load_known_terms, load_menu_primary_name_counter
+from model import KnownTerm, KnownTermsDB
+
+# Mersenne prime larger than any crc32 value
+_PRIME = (1 << 61) - 1
+
+
+def _shingles(name: str, k: int = 2) -> set[str]:
+    # Character k-grams, padded so that short names still get shingles
+    padded = "^" + name + "$"
+    return {padded[i : i + k] for i in range(len(padded) - k + 1)}
+
+
+def _jaccard_similarity(a: set[str], b: set[str]) -> float:
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """
+    MinHash signatures: for each of num_perm random hash functions, the
+    minimum hash over a set's elements. The fraction of equal positions in
+    two signatures estimates the sets' Jaccard similarity.
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 0):
+        rng = random.Random(seed)
+        self._coefficients = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, shingles: set[str]) -> tuple[int, ...]:
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+        return tuple(
+            [min([(a * h + b) % _PRIME for h in hashes]) for a, b in self._coefficients]
+        )
+
+
+def find_near_duplicate_clusters(
+    names: list[str], threshold: float = 0.5, bands: int = 32, rows: int = 3
+) -> list[list[str]]:
+    """
+    Groups names whose character shingles have Jaccard similarity of at least
+    threshold, via locality-sensitive hashing: names whose signatures agree
+    on all rows of any band become candidate pairs, which are then verified.
+    With the defaults, a pair with 0.5 similarity becomes a candidate with
+    probability 1 - (1 - 0.5^3)^32 = 0.99, and one with 0.2 similarity 0.23.
+    """
+    minhasher = MinHasher(num_perm=bands * rows)
+    name_shingles = {name: _shingles(name) for name in names}
+
+    # Bucket names by each band of their signature
+    buckets = collections.defaultdict(list)
+    for name, shingles in name_shingles.items():
+        signature = minhasher.signature(shingles)
+        for band in range(bands):
+            band_key = (band, signature[band * rows : (band + 1) * rows])
+            buckets[band_key].append(name)
+
+    # Union-find over verified candidate pairs
+    parent = {name: name for name in name_shingles}
+
+    def _find(name: str) -> str:
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    checked_pairs = set()
+    for bucket_names in buckets.values():
+        for i, a in enumerate(bucket_names):
+            for b in bucket_names[i + 1 :]:
+                if (a, b) in checked_pairs:
+                    continue
+                checked_pairs.add((a, b))
+                if _jaccard_similarity(name_shingles[a], name_shingles[b]) >= threshold:
+                    parent[_find(a)] = _find(b)
+
+    clusters = collections.defaultdict(list)
+    for name in name_shingles:
+        clusters[_find(name)].append(name)
+    return [sorted(c) for c in clusters.values() if len(c) > 1]
+
+
+def _find_linked_known_term(
+    cluster: list[str], db: KnownTermsDB
+) -> tuple[str, KnownTerm] | None:
+    # Prefer a member that is a known dish, then any known term
+    for lookup_dict in [db.known_dish_lookup_dict, db.known_terms_lookup_dict]:
+        for name in cluster:
+            if name in lookup_dict:
+                return name, lookup_dict[name]
+    return None
+
+
+def print_clusters_report(
+    menu_primary_name_counter: collections.Counter,
+    db: KnownTermsDB,
+    threshold: float = 0.5,
+) -> None:
+    clusters = find_near_duplicate_clusters(
+        sorted(menu_primary_name_counter), threshold
+    )
+
+    # Clusters spanning the most menus first
+    clusters.sort(key=lambda c: (-sum([menu_primary_name_counter[n] for n in c]), c))
+    for cluster in clusters:
+        menu_count = sum([menu_primary_name_counter[n] for n in cluster])
+        members = ", ".join([f"{n} ({menu_primary_name_counter[n]})" for n in cluster])
+
+        linked = _find_linked_known_term(cluster, db)
+        if linked:
+            native_name, known_term = linked
+            link = f'{native_name} "{known_term.name_en}"'
+        else:
+            link = "no known term"
+
+        print(f"[count {menu_count}] {members} -> {link}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3:
+        print("Usage: python cluster.py [input_dir] [threshold]", file=sys.stderr)
+        sys.exit(1)
+
+    input_dir = sys.argv[1] if len(sys.argv) >= 2 else INPUT_DIR
+    threshold = float(sys.argv[2]) if len(sys.argv) >= 3 else 0.5
+
+    db = load_known_terms()
+
+    menu_primary_name_counter = load_menu_primary_name_counter(input_dir)
+
+    print_clusters_report(menu_primary_name_counter, db, threshold)
@@ -0,0 +1,326 @@
+import hashlib
+import json
+import os
+import re
+
+from build_manifest import BuildManifest
+
+# At-rules whose blocks contain further rules (rather than declarations)
+NESTING_AT_RULES = ["@media", "@supports", "@container", "@layer", "@document"]
+
+_CLASS_ATTRIBUTE_PATTERN = re.compile(r"""\bclass\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+_SCRIPT_CLASS_PATTERN = re.compile(
+    r"""(?:classList\.(?:add|remove|toggle|replace)\(([^)]*)\)|className\s*=\s*([^;\n]*))"""
+)
+_STRING_LITERAL_PATTERN = re.compile(r"""["'`]([^"'`]*)["'`]""")
+_SELECTOR_CLASS_PATTERN = re.compile(r"\.((?:[\w-]|\\.)+)")
+
+
+def find_html_classes(html: str) -> set[str]:
+    classes = set()
+    for match in _CLASS_ATTRIBUTE_PATTERN.finditer(html):
+        classes.update((match.group(1) or match.group(2) or "").split())
+    return classes
+
+
+def find_script_classes(script: str) -> set[str]:
+    # Classes set from JavaScript, e.g. el.classList.add("show")
+    classes = set()
+    for match in _SCRIPT_CLASS_PATTERN.finditer(script):
+        args = match.group(1) or match.group(2) or ""
+        for literal in _STRING_LITERAL_PATTERN.findall(args):
+            classes.update(literal.split())
+    return classes
+
+
+def _skip_string(css: str, i: int) -> int:
+    # Returns the index after the string literal starting at i
+    quote = css[i]
+    i += 1
+    while i < len(css) and css[i] != quote:
+        i += 2 if css[i] == "\\" else 1
+    return i + 1
+
+
+def strip_comments(css: str) -> str:
+    parts = []
+    start = 0
+    i = 0
+    while i < len(css):
+        if css[i] in "\"'":
+            i = _skip_string(css, i)
+        elif css.startswith("/*", i):
+            parts.append(css[start:i])
+            i = css.find("*/", i + 2)
+            i = len(css) if i < 0 else i + 2
+            start = i
+        else:
+            i += 1
+    parts.append(css[start:i])
+    return "".join(parts)
+
+
+def _find_block_end(css: str, i: int) -> int:
+    # Returns the index of the "}" matching the "{" just before i
+    depth = 1
+    while i < len(css):
+        c = css[i]
+        if c in "\"'":
+            i = _skip_string(css, i)
+            continue
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    raise ValueError("unbalanced braces in CSS")
+
+
+def parse_css(css: str, i: int = 0) -> tuple[list[tuple[str, str | list]], int]:
+    """
+    Parses a minimal CSS syntax tree from css[i:] up to the closing "}" of the
+    enclosing block. Returns (rules, index after the block), where each rule
+    is (prelude, body): body is the declarations string, a list of nested
+    rules for @media and friends, or "" for statements like @charset.
+    """
+    rules = []
+    start = i
+    while i < len(css):
+        c = css[i]
+        if c in "\"'":
+            i = _skip_string(css, i)
+        elif c == "{":
+            prelude = css[start:i].strip()
+            if any([prelude.startswith(at_rule) for at_rule in NESTING_AT_RULES]):
+                children, i = parse_css(css, i + 1)
+                rules.append((prelude, children))
+            else:
+                end = _find_block_end(css, i + 1)
+                rules.append((prelude, css[i + 1 : end]))
+                i = end + 1
+            start = i
+        elif c == "}":
+            return rules, i + 1
+        elif c == ";" and css[start:i].strip().startswith("@"):
+            rules.append((css[start:i].strip(), ""))
+            i += 1
+            start = i
+        else:
+            i += 1
+    return rules, i
+
+
+def _split_selectors(selector_list: str) -> list[str]:
+    # Split on top-level commas only, e.g. not inside :is(.a, .b)
+    selectors = []
+    depth = 0
+    start = 0
+    for i, c in enumerate(selector_list):
+        if c in "([":
+            depth += 1
+        elif c in ")]":
+            depth -= 1
+        elif c == "," and depth == 0:
+            selectors.append(selector_list[start:i])
+            start = i + 1
+    selectors.append(selector_list[start:])
+    return selectors
+
+
+def _remove_negations(selector: str) -> str:
+    # .btn:not(.disabled) matches without .disabled being used anywhere
+    while (i := selector.find(":not(")) >= 0:
+        depth = 0
+        for j in range(i + 4, len(selector)):
+            if selector[j] == "(":
+                depth += 1
+            elif selector[j] == ")":
+                depth -= 1
+                if depth == 0:
+                    break
+        selector = selector[:i] + selector[j + 1 :]
+    return selector
+
+
+def _is_selector_used(selector: str, used_classes: set[str]) -> bool:
+    selector_classes = _SELECTOR_CLASS_PATTERN.findall(_remove_negations(selector))
+    return all([re.sub(r"\\(.)", r"\1", c) in used_classes for c in selector_classes])
+
+
+def purge_css(rules: list[tuple[str, str | list]], used_classes: set[str]) -> str:
+    """
+    Serializes rules, keeping only selectors whose classes are all in
+    used_classes. @keyframes, @font-face etc. are kept as-is.
+    """
+    css = ""
+    for prelude, body in rules:
+        if isinstance(body, list):
+            children_css = purge_css(body, used_classes)
+            if children_css:
+                css += prelude + "{" + children_css + "}"
+        elif prelude.startswith("@"):
+            css += prelude + ("{" + body + "}" if body else ";")
+        else:
+            selectors = [
+                s
+                for s in _split_selectors(prelude)
+                if _is_selector_used(s, used_classes)
+            ]
+            if selectors:
+                css += ",".join(selectors) + "{" + body + "}"
+    return css
+
+
+def license_comment(css: str) -> str:
+    # Keep the leading /*! ... */ license comment, as minifiers do
+    match = re.search(r"/\*!.*?\*/", css, re.DOTALL)
+    return match.group(0) if match else ""
+
+
+class CSSPurger:
+    """
+    Purges a stylesheet against sets of used classes. Purged stylesheets are
+    keyed by the source stylesheet hash and the sorted used classes, so if
+    the templates (and thus the rendered classes) haven't changed, a build
+    reuses the purged CSS from the JSON cache file at path.
+    """
+
+    def __init__(self, css_path: str, path: str | None = None):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+        with open(css_path, "r", encoding="utf-8") as f:
+            self._css = f.read()
+        self._css_hash = hashlib.sha256(self._css.encode("utf-8")).hexdigest()
+        self._rules: list[tuple[str, str | list]] | None = None
+
+        self._cached: dict[str, str] = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._cached = json.load(f)
+        # Only entries used by this build are saved
+        self._used: dict[str, str] = {}
+
+    def purge(self, used_classes: set[str]) -> str:
+        key = hashlib.sha256(
+            "\n".join([self._css_hash] + sorted(used_classes)).encode("utf-8")
+        ).hexdigest()
+
+        css = self._used.get(key) or self._cached.get(key)
+        if css is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            # Parse lazily, as fully cached builds don't need the rules
+            if self._rules is None:
+                self._rules, _ = parse_css(strip_comments(self._css))
+            css = purge_css(self._rules, used_classes)
+            # @charset must stay the first thing in the file
+            charset = re.match(r"@charset [^;]*;", css)
+            i = charset.end() if charset else 0
+            css = css[:i] + license_comment(self._css) + css[i:]
+        self._used[key] = css
+        return css
+
+    def save(self) -> None:
+        if not self.path:
+            return
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self._used, f, ensure_ascii=False)
+
+
+def purge_unused_css(
+    build_manifest: BuildManifest,
+    asset_manifest: dict[str, str],
+    css_url: str,
+    cache_path: str | None = None,
+    page_classes_cache_path: str | None = None,
+    inline: bool = False,
+) -> None:
+    """
+    Replaces the hashed copy of css_url in the output with one holding only
+    the rules used by the rendered pages, and relinks the pages to it. If
+    inline is set, each page instead gets its own purged rules in a <style>.
+    Updates asset_manifest in place.
+
+    Each page's classes are cached by the page's content hash from the build
+    manifest, so unchanged pages are read (to be relinked) but not scanned.
+    """
+    output_dir = build_manifest.output_dir
+    old_hashed_url = asset_manifest[css_url]
+    old_link = f'href="{old_hashed_url}"'
+
+    cached_page_classes = {}
+    if page_classes_cache_path and os.path.exists(page_classes_cache_path):
+        with open(page_classes_cache_path, "r", encoding="utf-8") as f:
+            cached_page_classes = json.load(f)
+
+    # Single pass over the rendered pages; inline scripts are scanned too
+    page_htmls = {}
+    page_classes = {}
+    page_classes_by_hash = {}
+    scanned_page_count = 0
+    html_urls = sorted([u for u in build_manifest.file_hashes if u.endswith(".html")])
+    for html_url in html_urls:
+        html_path = os.path.join(output_dir, html_url)
+        with open(html_path, "r", encoding="utf-8") as f:
+            html = f.read()
+        if old_link not in html:
+            continue
+
+        page_htmls[html_path] = html
+        sha256 = build_manifest.file_hashes[html_url]
+        if sha256 in cached_page_classes:
+            classes = set(cached_page_classes[sha256])
+        else:
+            classes = find_html_classes(html) | find_script_classes(html)
+            scanned_page_count += 1
+        page_classes[html_path] = classes
+        page_classes_by_hash[sha256] = sorted(classes)
+
+    # Only entries for this build's pages are saved
+    if page_classes_cache_path:
+        os.makedirs(os.path.dirname(page_classes_cache_path) or ".", exist_ok=True)
+        with open(page_classes_cache_path, "w", encoding="utf-8") as f:
+            json.dump(page_classes_by_hash, f)
+
+    purger = CSSPurger(os.path.join(output_dir, old_hashed_url), cache_path)
+    used_classes = set().union(*page_classes.values())
+    purged_css = purger.purge(used_classes)
+
+    # Same naming as prepare_output_dir(), e.g. static/bootstrap.min.<hash>.css
+    stem, ext = os.path.splitext(css_url)
+    content_hash = hashlib.sha256(purged_css.encode("utf-8")).hexdigest()[:12]
+    new_hashed_url = f"{stem}.{content_hash}{ext}"
+
+    old_size = os.path.getsize(os.path.join(output_dir, old_hashed_url))
+    build_manifest.remove(os.path.join(output_dir, old_hashed_url))
+    build_manifest.write_text(os.path.join(output_dir, new_hashed_url), purged_css)
+    asset_manifest[css_url] = new_hashed_url
+
+    if inline:
+        # No page links the stylesheet anymore
+        build_manifest.referenced_asset_paths.discard(css_url)
+    link_pattern = re.compile(r"<link[^>]*" + re.escape(old_link) + r"[^>]*>")
+    for html_path, html in page_htmls.items():
+        if inline:
+            # Inline the page's own rules, so the CSS no longer blocks rendering
+            # @charset is not allowed in <style>
+            page_css = re.sub(
+                r"^@charset [^;]*;", "", purger.purge(page_classes[html_path])
+            )
+            style = "<style>" + page_css + "</style>"
+            html = link_pattern.sub(lambda _: style, html)
+        else:
+            html = html.replace(old_link, f'href="{new_hashed_url}"')
+        build_manifest.write_text(html_path, html)
+
+    purger.save()
+    print(
+        f"Purged {css_url}: {old_size} -> {len(purged_css.encode('utf-8'))} bytes, {len(used_classes)} classes used ({len(page_htmls) - scanned_page_count} of {len(page_htmls)} pages cached, {purger.hits} cache hits, {purger.misses} misses)"
+    )
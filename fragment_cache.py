@@ -0,0 +1,96 @@
+import collections
+import hashlib
+import json
+import os
+from typing import Any
+
+from jinja2 import Environment
+
+import jinja_filters
+
+
+def _sha256(s: str) -> str:
+    return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+
+def _filters_version() -> str:
+    # Any change to jinja_filters.py invalidates all cached fragments
+    with open(jinja_filters.__file__, "r", encoding="utf-8") as f:
+        return _sha256(f.read())
+
+
+class FragmentCache:
+    """
+    LRU cache of rendered HTML fragments (e.g. a single menu item row).
+
+    Fragments are keyed by a content hash of the template context plus the
+    template source and jinja_filters versions, so stale entries are never
+    returned. If a path is given, entries are loaded from and saved to a JSON
+    file to be reused across builds.
+    """
+
+    def __init__(self, max_entries: int = 10000, path: str | None = None):
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+        self._fragments: collections.OrderedDict[str, str] = collections.OrderedDict()
+        self._template_versions: dict[str, str] = {}
+        self._filters_version = _filters_version()
+
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._fragments.update(json.load(f))
+
+    def _key(self, env: Environment, template_name: str, context: Any) -> str:
+        template_version = self._template_versions.get(template_name)
+        if not template_version:
+            assert env.loader
+            source, _, _ = env.loader.get_source(env, template_name)
+            template_version = _sha256(source)
+            self._template_versions[template_name] = template_version
+
+        context_json = json.dumps(
+            context, sort_keys=True, ensure_ascii=False, default=str
+        )
+        return _sha256(
+            "\n".join(
+                [template_name, template_version, self._filters_version, context_json]
+            )
+        )
+
+    def render(self, env: Environment, template_name: str, **context: Any) -> str:
+        key = self._key(env, template_name, context)
+
+        html = self._fragments.get(key)
+        if html is not None:
+            self.hits += 1
+            self._fragments.move_to_end(key)
+            return html
+
+        self.misses += 1
+        html = env.get_template(template_name).render(**context)
+        self._fragments[key] = html
+        if len(self._fragments) > self.max_entries:
+            # Evict least recently used
+            self._fragments.popitem(last=False)
+        return html
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def save(self) -> None:
+        if not self.path:
+            return
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self._fragments, f, ensure_ascii=False)
+
+    def print_report(self) -> None:
+        print(
+            f"Fragment cache: {self.hits} hits, {self.misses} misses ({self.hit_rate:.0%} hit rate), {len(self._fragments)} entries"
+        )
@@ -1,8 +1,11 @@
 import datetime
+import functools
 import re
 from markupsafe import Markup
 
 
+# Menu text repeats a lot across items and menus
+@functools.lru_cache(maxsize=4096)
 def styled_text_format(text: str) -> str:
     # Replace Markdown-style **bold**, *italic*, `code` with HTML tags
 
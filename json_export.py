@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+from typing import Any, Iterator
+
+# Compact and deterministic: no whitespace, sorted keys
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+def _public_fields(d: dict[str, Any], exclude: tuple[str, ...] = ()) -> dict[str, Any]:
+    # Drop internal (underscore) and explicitly excluded keys
+    return {k: v for k, v in d.items() if not k.startswith("_") and k not in exclude}
+
+
+def _annotation_fields(section_or_item: dict[str, Any]) -> dict[str, Any]:
+    # Term ids are the first native names of the matched known terms
+    segments = section_or_item.get("_segments")
+    if segments is None:
+        return {}
+    return {
+        "segments": segments,
+        "term_ids": [term_id for _, term_id in segments if term_id is not None],
+    }
+
+
+def build_menu_json(yaml_dict: dict[str, Any]) -> dict[str, Any]:
+    menu_json: dict[str, Any] = {
+        "author": yaml_dict["author"],
+        "date_modified": yaml_dict["_date_modified"],
+        "restaurant": _public_fields(yaml_dict["restaurant"]),
+    }
+
+    menu = yaml_dict.get("menu")
+    if menu:
+        pages = []
+        for page in menu["pages"]:
+            sections = []
+            for section in page.get("sections", []):
+                items = []
+                for menu_item in section.get("menu_items", []):
+                    items.append(
+                        {
+                            **_public_fields(menu_item),
+                            **_annotation_fields(menu_item),
+                        }
+                    )
+
+                section_json = {
+                    **_public_fields(section, exclude=("menu_items",)),
+                    **_annotation_fields(section),
+                    "items": items,
+                }
+                if section.get("_id"):
+                    section_json["id"] = section["_id"]
+                sections.append(section_json)
+
+            pages.append(
+                {**_public_fields(page, exclude=("sections",)), "sections": sections}
+            )
+
+        menu_json["menu"] = {
+            **_public_fields(menu, exclude=("pages",)),
+            "pages": pages,
+        }
+
+    return menu_json
+
+
+def _sha256_chunks(chunks: Iterator[str]) -> str:
+    h = hashlib.sha256()
+    for chunk in chunks:
+        h.update(chunk.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _sha256_file(path: str) -> str | None:
+    if not os.path.exists(path):
+        return None
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def write_json_if_changed(data: Any, output_json_path: str) -> tuple[str, bool]:
+    """
+    Streams data as compact JSON to output_json_path, unless the file already
+    has identical content. Returns the content hash and whether it was written.
+    """
+    # First pass only hashes, so unchanged files are never rewritten
+    sha256 = _sha256_chunks(_ENCODER.iterencode(data))
+    if sha256 == _sha256_file(output_json_path):
+        return sha256, False
+
+    with open(output_json_path, "w", encoding="utf-8") as json_file:
+        for chunk in _ENCODER.iterencode(data):
+            json_file.write(chunk)
+    return sha256, True
@@ -1,5 +1,8 @@
+import collections
 import csv
 import datetime
+import glob
+import hashlib
 import os
 import shutil
 import sys
@@ -11,24 +14,95 @@ import strictyaml
 from jinja2 import Environment, FileSystemLoader
 
 import jinja_filters
+from build_manifest import BuildManifest
+from css_purge import purge_unused_css
+from fragment_cache import FragmentCache
+from json_export import build_menu_json, write_json_if_changed
 from model import KnownTerm, KnownTermsDB
+from pwa import generate_pwa_files
 from schema import RESTAURANT_SCHEMA
-from stats import gather_menu_stats
+from stats import gather_menu_stats, menu_primary_names
+from term_index import TermIndex
 
 STATIC_DIR = "static"
 INPUT_DIR = "content"
 OUTPUT_DIR = "output"
-
-
-def prepare_output_dir(output_dir: str) -> None:
+KNOWN_TERMS_PATH = os.path.join("data", "known_terms.tsv")
+TERM_INDEX_GLOB = os.path.join("data", "*.termidx")
+FRAGMENT_CACHE_PATH = os.path.join(".cache", "fragments.json")
+STATS_PARTIALS_PATH = os.path.join(".cache", "stats_partials.json")
+PURGED_CSS_CACHE_PATH = os.path.join(".cache", "purged_css.json")
+PAGE_CLASSES_CACHE_PATH = os.path.join(".cache", "page_classes.json")
+# Inline each page's used Bootstrap rules instead of linking the stylesheet
+INLINE_CRITICAL_CSS = False
+# Make every menu page available offline, not just the ones already visited.
+# Off by default, as it makes a first visit download every menu.
+PRECACHE_MENU_PAGES = False
+
+
+def prepare_output_dir(
+    output_dir: str, build_manifest: BuildManifest
+) -> dict[str, str]:
     os.makedirs(output_dir, exist_ok=True)
 
-    # cp -r ./static/ -> ./output/static/
     output_static_dir = os.path.join(output_dir, STATIC_DIR)
     if os.path.exists(output_static_dir):
         shutil.rmtree(output_static_dir)
 
-    shutil.copytree(STATIC_DIR, output_static_dir)
+    # cp ./static/style.css -> ./output/static/style.<hash>.css etc.
+    # Content-hashed names let browsers cache the assets forever.
+    asset_manifest = {}
+    for root, _, files in os.walk(STATIC_DIR):
+        for filename in sorted(files):
+            input_path = os.path.join(root, filename)
+            with open(input_path, "rb") as f:
+                sha256 = hashlib.sha256(f.read()).hexdigest()
+            content_hash = sha256[:12]
+
+            stem, ext = os.path.splitext(filename)
+            relative_dir = os.path.relpath(root, STATIC_DIR)
+            hashed_path = os.path.normpath(
+                os.path.join(STATIC_DIR, relative_dir, f"{stem}.{content_hash}{ext}")
+            )
+            os.makedirs(
+                os.path.join(output_dir, os.path.dirname(hashed_path)), exist_ok=True
+            )
+            shutil.copyfile(input_path, os.path.join(output_dir, hashed_path))
+            build_manifest.record(os.path.join(output_dir, hashed_path), sha256)
+
+            # Paths are URLs relative to the output dir
+            asset_manifest[input_path.replace(os.sep, "/")] = hashed_path.replace(
+                os.sep, "/"
+            )
+
+    # Hashed assets never change, so hosts that read _headers (e.g. Netlify,
+    # Cloudflare Pages) can mark them immutable
+    with open(os.path.join(output_dir, "_headers"), "w", encoding="utf-8") as f:
+        f.write(f"/{STATIC_DIR}/*\n")
+        f.write("  Cache-Control: public, max-age=31536000, immutable\n")
+
+    return asset_manifest
+
+
+def create_template_env(
+    asset_manifest: dict[str, str], build_manifest: BuildManifest
+) -> Environment:
+    env = Environment(loader=FileSystemLoader("templates"))
+    # https://jinja.palletsprojects.com/en/3.1.x/templates/#whitespace-control
+    env.trim_blocks = True
+    env.lstrip_blocks = True
+
+    # Install custom Jinja filters
+    for filter_name in jinja_filters.ALL_FILTERS:
+        env.filters[filter_name] = getattr(jinja_filters, filter_name)
+
+    # Templates link static files via {{ asset_url("static/style.css") }}
+    def asset_url(path: str) -> str:
+        build_manifest.referenced_asset_paths.add(path)
+        return asset_manifest[path]
+
+    env.globals["asset_url"] = asset_url
+    return env
 
 
 def load_known_locales() -> dict[str, dict[str, str]]:
@@ -49,7 +123,7 @@ def load_known_locales() -> dict[str, dict[str, str]]:
 
 def load_known_terms() -> KnownTermsDB:
     known_terms = []
-    with open("data/known_terms.tsv", "r", encoding="utf-8") as csvfile:
+    with open(KNOWN_TERMS_PATH, "r", encoding="utf-8") as csvfile:
         csvreader = csv.DictReader(csvfile, delimiter="\t")
         for row in csvreader:
             assert any(row.values()), "ERROR: known_terms has empty lines"
@@ -57,21 +131,45 @@ def load_known_terms() -> KnownTermsDB:
             known_term = KnownTerm(row)
             known_terms.append(known_term)
 
-    return KnownTermsDB(known_terms)
+    # Large external dictionaries, compiled with term_index.py
+    term_indexes = [TermIndex(p) for p in sorted(glob.glob(TERM_INDEX_GLOB))]
+
+    return KnownTermsDB(known_terms, term_indexes)
 
 
 def _slugify(s: str) -> str:
     return "".join([c if c.isalnum() else "-" for c in s])
 
 
-def generate_menu_html(
-    input_yaml_path: str, output_filename: str, output_html_path: str, db: KnownTermsDB
-) -> dict[str, Any]:
+def load_menu_yaml(input_yaml_path: str) -> OrderedDict[str, Any]:
     with open(input_yaml_path, "r", encoding="utf-8") as yaml_path:
         yaml_data = strictyaml.load(yaml_path.read(), RESTAURANT_SCHEMA)
 
     # The type checker thinks yaml_data.data is a str, not a dict
-    yaml_dict = typing.cast(OrderedDict[str, Any], yaml_data.data)
+    return typing.cast(OrderedDict[str, Any], yaml_data.data)
+
+
+def load_menu_primary_name_counter(input_dir: str) -> collections.Counter:
+    # Count the number of menus each primary name appears in
+    menu_primary_name_counter = collections.Counter()
+    for root, _, files in os.walk(input_dir):
+        for filename in sorted(files):
+            if filename.endswith(".yaml"):
+                yaml_dict = load_menu_yaml(os.path.join(root, filename))
+                menu_primary_name_counter.update(menu_primary_names(yaml_dict))
+    return menu_primary_name_counter
+
+
+def generate_menu_html(
+    input_yaml_path: str,
+    output_filename: str,
+    output_html_path: str,
+    db: KnownTermsDB,
+    env: Environment,
+    fragment_cache: FragmentCache,
+    build_manifest: BuildManifest,
+) -> dict[str, Any]:
+    yaml_dict = load_menu_yaml(input_yaml_path)
 
     yaml_dict["_output_filename"] = output_filename
 
@@ -138,8 +236,6 @@ def generate_menu_html(
     def _annotate_menu_section_or_item_with_known_terms(
         section_or_item: dict[str, Any],
         is_section: bool,
-        ordered_known_terms: list[str],
-        known_terms_lookup_dict: dict[str, KnownTerm],
     ) -> list[KnownTerm]:
         primary_lang_tag = yaml_dict["menu"]["language_codes"][0]
 
@@ -153,75 +249,52 @@ def generate_menu_html(
 
         matched_known_terms = []
         annotated_html = ""
-        # Match from left to right
-        i = 0
-        while i < len(primary_name):
-            matched = False
+        segments = []
+        for key, known_term in db.segment(primary_name, include_dishes=not is_section):
+            # The first native name is non-empty for any matched term, unlike
+            # name_primary (e.g. Cantonese-only terms), and is a single name
+            segments.append(
+                [key, known_term.all_native_names[0] if known_term else None]
+            )
 
-            # Preferring longest possible match first
-            for key in ordered_known_terms:
-                assert len(key) > 0
-
-                if primary_name[i:].startswith(key):
-                    annotated_html += '<span class="term-native">'
-                    annotated_html += key
-                    annotated_html += '<span class="term-translated">'
-
-                    known_term = known_terms_lookup_dict[key]
+            # If no match, just add the character
+            if not known_term:
+                annotated_html += '<span class="term-native">' f"{key}" "</span>"
+                continue
 
-                    wikipedia_url = known_term.wikipedia_url
-                    if wikipedia_url:
-                        annotated_html += f'<a href="{wikipedia_url}" target="wikipedia" rel="noopener">'
+            annotated_html += '<span class="term-native">'
+            annotated_html += key
+            annotated_html += '<span class="term-translated">'
 
-                    term_en = known_term.name_en
-                    if is_section:
-                        term_en = term_en.title()
-                    annotated_html += term_en
+            wikipedia_url = known_term.wikipedia_url
+            if wikipedia_url:
+                annotated_html += (
+                    f'<a href="{wikipedia_url}" target="wikipedia" rel="noopener">'
+                )
 
-                    if wikipedia_url:
-                        annotated_html += f"</a>"
+            term_en = known_term.name_en
+            if is_section:
+                term_en = term_en.title()
+            annotated_html += term_en
 
-                    annotated_html += "</span>"
-                    annotated_html += "</span>"
+            if wikipedia_url:
+                annotated_html += f"</a>"
 
-                    i += len(key)
-                    matched = True
-                    matched_known_terms.append(known_term)
+            annotated_html += "</span>"
+            annotated_html += "</span>"
 
-                    # Use data from this matching term to possibly enrich the section_or_item
-                    if not section_or_item.get("image_url") and known_term.image_url:
-                        section_or_item["image_url"] = known_term.image_url
-                    if (
-                        not section_or_item.get("wikipedia_url")
-                        and known_term.wikipedia_url
-                    ):
-                        section_or_item["wikipedia_url"] = known_term.wikipedia_url
+            matched_known_terms.append(known_term)
 
-                    break
-
-            # If no match, just add the character
-            if not matched:
-                annotated_html += (
-                    '<span class="term-native">' f"{primary_name[i]}" "</span>"
-                )
-                i += 1
+            # Use data from this matching term to possibly enrich the section_or_item
+            if not section_or_item.get("image_url") and known_term.image_url:
+                section_or_item["image_url"] = known_term.image_url
+            if not section_or_item.get("wikipedia_url") and known_term.wikipedia_url:
+                section_or_item["wikipedia_url"] = known_term.wikipedia_url
 
         section_or_item["_annotated_name"] = annotated_html
+        section_or_item["_segments"] = segments
         return matched_known_terms
 
-    # CHINESE ONLY
-    # Match against longest terms first
-    ordered_nondish_terms = sorted(
-        {
-            k: v
-            for k, v in db.known_terms_lookup_dict.items()
-            if not v.dish_cuisine_locale
-        },
-        key=len,
-        reverse=True,
-    )
-    ordered_all_terms = sorted(db.known_terms_lookup_dict, key=len, reverse=True)
-
     # For each Chinese section/menu_item, try to annotate it
     menu = yaml_dict.get("menu")
     if menu:
@@ -230,7 +303,7 @@ def generate_menu_html(
             for section in sections:
                 # Annotate section name
                 matched_known_terms = _annotate_menu_section_or_item_with_known_terms(
-                    section, True, ordered_nondish_terms, db.known_terms_lookup_dict
+                    section, True
                 )
                 for known_term in matched_known_terms:
                     if not output_filename in known_term._menu_filenames:
@@ -241,24 +314,25 @@ def generate_menu_html(
                     # Annotate menu item name
                     matched_known_terms = (
                         _annotate_menu_section_or_item_with_known_terms(
-                            menu_item,
-                            False,
-                            ordered_all_terms,
-                            db.known_terms_lookup_dict,
+                            menu_item, False
                         )
                     )
                     for known_term in matched_known_terms:
                         if not output_filename in known_term._menu_filenames:
                             known_term._menu_filenames.append(output_filename)
 
-    env = Environment(loader=FileSystemLoader("templates"))
-    # https://jinja.palletsprojects.com/en/3.1.x/templates/#whitespace-control
-    env.trim_blocks = True
-    env.lstrip_blocks = True
-
-    # Install custom Jinja filters
-    for filter_name in jinja_filters.ALL_FILTERS:
-        env.filters[filter_name] = getattr(jinja_filters, filter_name)
+    # Pre-render menu items, reusing cached fragments for repeated items
+    if menu:
+        for page in menu["pages"]:
+            for section in page.get("sections", []):
+                for menu_item in section.get("menu_items", []):
+                    menu_item["_html"] = fragment_cache.render(
+                        env,
+                        "menu_item_fragment.j2",
+                        item=menu_item,
+                        display_language_codes=display_language_codes,
+                        primary_lang=display_language_codes[0],
+                    )
 
     # Render the output file
     template = env.get_template("menu_template.j2")
@@ -266,14 +340,18 @@ def generate_menu_html(
         data=yaml_dict, display_language_codes=display_language_codes
     )
 
-    with open(output_html_path, "w", encoding="utf-8") as html_path:
-        html_path.write(rendered_html)
+    build_manifest.write_text(output_html_path, rendered_html)
 
     return yaml_dict
 
 
 def process_menu_yaml_paths(
-    input_dir: str, output_dir: str, db: KnownTermsDB
+    input_dir: str,
+    output_dir: str,
+    db: KnownTermsDB,
+    env: Environment,
+    fragment_cache: FragmentCache,
+    build_manifest: BuildManifest,
 ) -> dict[str, Any]:
     menu_filename_to_menu_yaml_dict = {}
     for root, _, files in os.walk(input_dir):
@@ -286,39 +364,82 @@ def process_menu_yaml_paths(
                 output_path = os.path.join(output_dir, output_filename)
 
                 yaml_dict = generate_menu_html(
-                    input_path, output_filename, output_path, db
+                    input_path,
+                    output_filename,
+                    output_path,
+                    db,
+                    env,
+                    fragment_cache,
+                    build_manifest,
                 )
 
                 menu_filename_to_menu_yaml_dict[output_filename] = yaml_dict
 
                 print(f"Processed: {input_path} -> {output_path}")
 
+                # Write structured menu data alongside the HTML
+                json_filename = os.path.splitext(relative_path)[0] + ".json"
+                json_path = os.path.join(output_dir, json_filename)
+                sha256, written = write_json_if_changed(
+                    build_menu_json(yaml_dict), json_path
+                )
+                build_manifest.record(json_path, sha256)
+                yaml_dict["_json_filename"] = json_filename
+                yaml_dict["_json_sha256"] = sha256
+
+                if written:
+                    print(f"Processed: {input_path} -> {json_path}")
+
     return menu_filename_to_menu_yaml_dict
 
 
-def generate_index_html(
-    menu_yaml_dicts: list[dict[str, Any]], db: KnownTermsDB, output_html_path: str
+def generate_menus_manifest_json(
+    menu_yaml_dicts: list[dict[str, Any]],
+    output_json_path: str,
+    build_manifest: BuildManifest,
 ) -> None:
-    env = Environment(loader=FileSystemLoader("templates"))
-    # https://jinja.palletsprojects.com/en/3.1.x/templates/#whitespace-control
-    env.trim_blocks = True
-    env.lstrip_blocks = True
+    menus = []
+    for yaml_dict in sorted(menu_yaml_dicts, key=lambda d: d["_json_filename"]):
+        restaurant_dict = yaml_dict["restaurant"]
+        menus.append(
+            {
+                "json_filename": yaml_dict["_json_filename"],
+                "html_filename": yaml_dict["_output_filename"],
+                "sha256": yaml_dict["_json_sha256"],
+                "name": restaurant_dict["name"],
+                "city": restaurant_dict["city"],
+                "country_code": restaurant_dict["country_code"],
+            }
+        )
+
+    sha256, _ = write_json_if_changed({"menus": menus}, output_json_path)
+    build_manifest.record(output_json_path, sha256)
+
 
+def generate_index_html(
+    menu_yaml_dicts: list[dict[str, Any]],
+    db: KnownTermsDB,
+    env: Environment,
+    output_html_path: str,
+    build_manifest: BuildManifest,
+) -> None:
     # Render the output file
     template = env.get_template("index_template.j2")
     rendered_html = template.render(
         menu_yaml_dicts=menu_yaml_dicts, known_dishes=db.known_dishes
     )
 
-    with open(output_html_path, "w", encoding="utf-8") as html_path:
-        html_path.write(rendered_html)
+    build_manifest.write_text(output_html_path, rendered_html)
 
 
 def generate_dishes_html(
     known_locale_lookup_dict: dict[str, dict[str, str]],
     db: KnownTermsDB,
     menu_filename_to_menu_yaml_dict: dict[str, dict[str, Any]],
+    env: Environment,
     output_html_path: str,
+    fragment_cache: FragmentCache,
+    build_manifest: BuildManifest,
 ) -> None:
     # Group known_dishes by locale
     locale_dish_groups = []
@@ -328,35 +449,48 @@ def generate_dishes_html(
             dish for dish in db.known_dishes if dish.dish_cuisine_locale == locale_code
         ]
         locale_dishes = sorted(locale_dishes, key=lambda d: d.name_en)
-        locale_dish_group = {**locale_dict, "dishes": locale_dishes}
+
+        # Pre-render dish cards, reusing cached fragments from previous builds
+        dish_htmls = []
+        for dish in locale_dishes:
+            dish_htmls.append(
+                fragment_cache.render(
+                    env,
+                    "dish_fragment.j2",
+                    known_dish=dish,
+                    locale_code=locale_code,
+                    menu_filename_to_restaurant_name={
+                        menu_filename: menu_filename_to_menu_yaml_dict[menu_filename][
+                            "restaurant"
+                        ]["name"]
+                        for menu_filename in dish._menu_filenames
+                    },
+                )
+            )
+
+        locale_dish_group = {
+            **locale_dict,
+            "dishes": locale_dishes,
+            "dish_htmls": dish_htmls,
+        }
         locale_dish_groups.append(locale_dish_group)
     locale_dish_groups = sorted(locale_dish_groups, key=lambda d: d["cuisine_name_en"])
 
-    env = Environment(loader=FileSystemLoader("templates"))
-    # https://jinja.palletsprojects.com/en/3.1.x/templates/#whitespace-control
-    env.trim_blocks = True
-    env.lstrip_blocks = True
-
     # Render the output file
     template = env.get_template("dishes_template.j2")
-    rendered_html = template.render(
-        locale_dish_groups=locale_dish_groups,
-        menu_filename_to_menu_yaml_dict=menu_filename_to_menu_yaml_dict,
-    )
+    rendered_html = template.render(locale_dish_groups=locale_dish_groups)
 
-    with open(output_html_path, "w", encoding="utf-8") as html_path:
-        html_path.write(rendered_html)
+    build_manifest.write_text(output_html_path, rendered_html)
 
 
 def generate_stats_html(
-    menu_yaml_dicts: list[dict[str, Any]], db: KnownTermsDB, output_html_path: str
+    menu_yaml_dicts: list[dict[str, Any]],
+    db: KnownTermsDB,
+    env: Environment,
+    output_html_path: str,
+    build_manifest: BuildManifest,
 ) -> None:
-    menu_stats = gather_menu_stats(menu_yaml_dicts, db)
-
-    env = Environment(loader=FileSystemLoader("templates"))
-    # https://jinja.palletsprojects.com/en/3.1.x/templates/#whitespace-control
-    env.trim_blocks = True
-    env.lstrip_blocks = True
+    menu_stats = gather_menu_stats(menu_yaml_dicts, db, STATS_PARTIALS_PATH)
 
     # Render the output file
     template = env.get_template("stats_template.j2")
@@ -367,25 +501,23 @@ def generate_stats_html(
         known_dish_lookup_dict=db.known_dish_lookup_dict,
     )
 
-    with open(output_html_path, "w", encoding="utf-8") as html_path:
-        html_path.write(rendered_html)
+    build_manifest.write_text(output_html_path, rendered_html)
 
 
 def generate_html(
-    template_name: str, data: Any, output_dir: str, html_filename: str
+    template_name: str,
+    data: Any,
+    env: Environment,
+    output_dir: str,
+    html_filename: str,
+    build_manifest: BuildManifest,
 ) -> None:
-    env = Environment(loader=FileSystemLoader("templates"))
-    # https://jinja.palletsprojects.com/en/3.1.x/templates/#whitespace-control
-    env.trim_blocks = True
-    env.lstrip_blocks = True
-
     # Render the output file
     template = env.get_template(template_name)
     rendered_html = template.render(data=data)
 
     output_html_path = os.path.join(output_dir, html_filename)
-    with open(output_html_path, "w", encoding="utf-8") as html_file:
-        html_file.write(rendered_html)
+    build_manifest.write_text(output_html_path, rendered_html)
 
     print(f"Processed: {output_html_path}")
 
@@ -395,10 +527,18 @@ def main(input_dir: str, output_dir: str):
     known_locale_lookup_dict = load_known_locales()
     db = load_known_terms()
 
-    prepare_output_dir(output_dir)
+    # Records every output file and its hash as it's written
+    build_manifest = BuildManifest(output_dir)
+
+    asset_manifest = prepare_output_dir(output_dir, build_manifest)
+    env = create_template_env(asset_manifest, build_manifest)
+
+    fragment_cache = FragmentCache(path=FRAGMENT_CACHE_PATH)
 
     # Generate menu pages
-    menu_filename_to_menu_yaml_dict = process_menu_yaml_paths(input_dir, output_dir, db)
+    menu_filename_to_menu_yaml_dict = process_menu_yaml_paths(
+        input_dir, output_dir, db, env, fragment_cache, build_manifest
+    )
 
     unused_known_terms = [kt for kt in db.known_terms if not kt._menu_filenames]
     if unused_known_terms:
@@ -406,24 +546,76 @@ def main(input_dir: str, output_dir: str):
             f"known_terms defined but not referenced from any menus: {[(kt.name_primary, kt.name_en) for kt in unused_known_terms]}"
         )
 
+    # Generate manifest of menu JSON files
+    output_path = os.path.join(output_dir, "menus.json")
+    generate_menus_manifest_json(
+        list(menu_filename_to_menu_yaml_dict.values()), output_path, build_manifest
+    )
+    print(f"Processed: {output_path}")
+
     # Generate index page
     output_path = os.path.join(output_dir, "index.html")
-    generate_index_html(list(menu_filename_to_menu_yaml_dict.values()), db, output_path)
+    generate_index_html(
+        list(menu_filename_to_menu_yaml_dict.values()),
+        db,
+        env,
+        output_path,
+        build_manifest,
+    )
     print(f"Processed: {output_path}")
 
     # Generate dishes page
     output_path = os.path.join(output_dir, "dishes.html")
     generate_dishes_html(
-        known_locale_lookup_dict, db, menu_filename_to_menu_yaml_dict, output_path
+        known_locale_lookup_dict,
+        db,
+        menu_filename_to_menu_yaml_dict,
+        env,
+        output_path,
+        fragment_cache,
+        build_manifest,
     )
     print(f"Processed: {output_path}")
 
     # Generate stats page
     output_path = os.path.join(output_dir, "stats.html")
-    generate_stats_html(list(menu_filename_to_menu_yaml_dict.values()), db, output_path)
+    generate_stats_html(
+        list(menu_filename_to_menu_yaml_dict.values()),
+        db,
+        env,
+        output_path,
+        build_manifest,
+    )
 
     # Generate about page
-    generate_html("about_template.j2", None, output_dir, "about.html")
+    generate_html(
+        "about_template.j2", None, env, output_dir, "about.html", build_manifest
+    )
+
+    # Drop Bootstrap rules that no rendered page uses
+    purge_unused_css(
+        build_manifest,
+        asset_manifest,
+        "static/bootstrap.min.css",
+        PURGED_CSS_CACHE_PATH,
+        PAGE_CLASSES_CACHE_PATH,
+        inline=INLINE_CRITICAL_CSS,
+    )
+
+    # Generate web app manifest and service worker, precaching the final output
+    generate_pwa_files(
+        build_manifest,
+        env,
+        asset_manifest,
+        [
+            yaml_dict["_output_filename"]
+            for yaml_dict in menu_filename_to_menu_yaml_dict.values()
+        ],
+        precache_menu_pages=PRECACHE_MENU_PAGES,
+    )
+
+    fragment_cache.save()
+    fragment_cache.print_report()
 
 
 if __name__ == "__main__":
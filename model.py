@@ -1,6 +1,10 @@
 import dataclasses
+import typing
 import urllib.parse
 
+if typing.TYPE_CHECKING:
+    from term_index import TermIndex
+
 EN_STOPWORDS = ["a", "an", "and", "BBQ", "for", "in", "with"]
 
 
@@ -94,8 +98,16 @@ class KnownTermsDB:
     # Mapping of native name to dish object (which is a KnownTerm)
     known_dish_lookup_dict: dict[str, KnownTerm]
 
-    def __init__(self, known_terms: list[KnownTerm]):
+    # Compiled external dictionaries, consulted after known_terms
+    term_indexes: list["TermIndex"]
+
+    def __init__(
+        self,
+        known_terms: list[KnownTerm],
+        term_indexes: list["TermIndex"] | None = None,
+    ):
         self.known_terms = known_terms
+        self.term_indexes = term_indexes or []
 
         # Look for duplicates and warn
         for lang in known_terms[0].native_name_dict.keys():
@@ -127,6 +139,45 @@ class KnownTermsDB:
                 {native_name: known_dish for native_name in known_dish.all_native_names}
             )
 
+        self._max_key_length = max(
+            [len(k) for k in self.known_terms_lookup_dict], default=0
+        )
+
+    def match_known_term(
+        self, text: str, include_dishes: bool = True
+    ) -> tuple[str, KnownTerm] | None:
+        # Find the longest native name that text starts with
+        match = None
+        for length in range(min(len(text), self._max_key_length), 0, -1):
+            known_term = self.known_terms_lookup_dict.get(text[:length])
+            if known_term and (include_dishes or not known_term.dish_cuisine_locale):
+                match = (text[:length], known_term)
+                break
+
+        # External dictionaries only win with a strictly longer match
+        for term_index in self.term_indexes:
+            index_match = term_index.match_prefix(text, include_dishes)
+            if index_match and (not match or len(index_match[0]) > len(match[0])):
+                match = index_match
+
+        return match
+
+    def segment(
+        self, text: str, include_dishes: bool = True
+    ) -> list[tuple[str, KnownTerm | None]]:
+        # Match from left to right, falling back to single unmatched characters
+        segments = []
+        i = 0
+        while i < len(text):
+            match = self.match_known_term(text[i:], include_dishes)
+            if match:
+                segments.append(match)
+                i += len(match[0])
+            else:
+                segments.append((text[i], None))
+                i += 1
+        return segments
+
     def find_known_term(
         self, substr: str, startswith: bool = False, endswith: bool = False
     ) -> KnownTerm | None:
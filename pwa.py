@@ -0,0 +1,75 @@
+import os
+
+from jinja2 import Environment
+
+from build_manifest import BuildManifest
+from json_export import write_json_if_changed
+
+WEB_APP_MANIFEST_FILENAME = "manifest.webmanifest"
+SERVICE_WORKER_FILENAME = "sw.js"
+ICON_PATH = "static/icon.svg"
+# Pages precached regardless of PRECACHE_MENU_PAGES
+CORE_PAGE_FILENAMES = ["index.html", "dishes.html", "about.html", "stats.html"]
+
+
+def build_precache_revisions(
+    build_manifest: BuildManifest,
+    asset_manifest: dict[str, str],
+    menu_filenames: list[str],
+    precache_menu_pages: bool,
+) -> dict[str, str]:
+    # Everything comes from the build manifest, so nothing is rehashed here.
+    # Only assets the output links are precached, e.g. not a stylesheet that
+    # was inlined into every page.
+    urls = CORE_PAGE_FILENAMES + [WEB_APP_MANIFEST_FILENAME]
+    urls += [asset_manifest[p] for p in build_manifest.referenced_asset_paths]
+    if precache_menu_pages:
+        urls += [f.replace(os.sep, "/") for f in menu_filenames]
+
+    return {url: build_manifest.file_hashes[url][:12] for url in sorted(urls)}
+
+
+def generate_pwa_files(
+    build_manifest: BuildManifest,
+    env: Environment,
+    asset_manifest: dict[str, str],
+    menu_filenames: list[str],
+    precache_menu_pages: bool = False,
+) -> None:
+    output_dir = build_manifest.output_dir
+
+    # https://developer.mozilla.org/en-US/docs/Web/Manifest
+    web_app_manifest = {
+        "name": "MenuDB",
+        "short_name": "MenuDB",
+        "start_url": "index.html",
+        "scope": "./",
+        "display": "standalone",
+        "theme_color": "#dc143c",  # crimson, as the navbar
+        "background_color": "#ffffff",
+        "icons": [
+            {
+                "src": asset_manifest[ICON_PATH],
+                "sizes": "any",
+                "type": "image/svg+xml",
+            }
+        ],
+    }
+    output_path = os.path.join(output_dir, WEB_APP_MANIFEST_FILENAME)
+    sha256, _ = write_json_if_changed(web_app_manifest, output_path)
+    build_manifest.record(output_path, sha256)
+    build_manifest.referenced_asset_paths.add(ICON_PATH)
+    print(f"Processed: {output_path}")
+
+    precache_revisions = build_precache_revisions(
+        build_manifest, asset_manifest, menu_filenames, precache_menu_pages
+    )
+
+    # The service worker itself is never precached; browsers check it for
+    # updates on navigation
+    template = env.get_template("service_worker.j2")
+    output_path = os.path.join(output_dir, SERVICE_WORKER_FILENAME)
+    build_manifest.write_text(
+        output_path, template.render(precache_revisions=precache_revisions)
+    )
+    print(f"Processed: {output_path} ({len(precache_revisions)} precached files)")
@@ -0,0 +1,112 @@
+import contextlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+from typing import Any, Iterator, TextIO
+
+from main import load_known_terms
+from model import KnownTermsDB
+
+# Lines are processed in batches so memory stays bounded on huge inputs
+BATCH_SIZE = 10000
+
+# Set per worker process by _init_worker()
+_db: KnownTermsDB | None = None
+
+
+def annotate_name(db: KnownTermsDB, name: str) -> dict[str, Any]:
+    # Same lookups as generate_menu_html(): known dish first, then terms
+    known_dish = db.known_dish_lookup_dict.get(name)
+
+    terms = []
+    unmatched = []
+    wikipedia_url = known_dish.wikipedia_url if known_dish else None
+    image_url = known_dish.image_url if known_dish else None
+    for key, known_term in db.segment(name):
+        if not known_term:
+            unmatched.append(key)
+            continue
+
+        terms.append(
+            {
+                "text": key,
+                "name_en": known_term.name_en,
+                "wikipedia_url": known_term.wikipedia_url or None,
+            }
+        )
+        # Use data from the first matching terms, as the menu pages do
+        wikipedia_url = wikipedia_url or known_term.wikipedia_url or None
+        image_url = image_url or known_term.image_url or None
+
+    return {
+        "name": name,
+        "name_en": known_dish.name_en if known_dish else None,
+        "wikipedia_url": wikipedia_url,
+        "image_url": image_url,
+        "terms": terms,
+        "unmatched": unmatched,
+    }
+
+
+def _init_worker() -> None:
+    global _db
+    # Keep known_terms warnings out of the JSONL output
+    with contextlib.redirect_stdout(sys.stderr):
+        _db = load_known_terms()
+
+
+def _annotate_line(line: str) -> tuple[str, int]:
+    assert _db
+    result = annotate_name(_db, line)
+    return json.dumps(result, ensure_ascii=False), len(result["unmatched"])
+
+
+def _read_names(f: TextIO) -> Iterator[str]:
+    for line in f:
+        name = line.strip()
+        if name:
+            yield name
+
+
+def segment_names(input_file: TextIO, output_file: TextIO, processes: int) -> None:
+    name_count = 0
+    char_count = 0
+    unmatched_char_count = 0
+    fully_matched_count = 0
+
+    with multiprocessing.Pool(processes, initializer=_init_worker) as pool:
+        names = _read_names(input_file)
+        while batch := list(itertools.islice(names, BATCH_SIZE)):
+            chunksize = max(1, len(batch) // (processes * 4))
+            results = pool.imap(_annotate_line, batch, chunksize)
+            for name, (json_line, unmatched_count) in zip(batch, results):
+                output_file.write(json_line + "\n")
+
+                # Tally dictionary coverage
+                name_count += 1
+                char_count += len(name)
+                unmatched_char_count += unmatched_count
+                if not unmatched_count:
+                    fully_matched_count += 1
+
+    if char_count:
+        coverage = 1 - unmatched_char_count / char_count
+        print(
+            f"Segmented {name_count} names: {fully_matched_count} fully matched, {coverage:.1%} character coverage",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        print("Usage: python segment.py [input_file]", file=sys.stderr)
+        sys.exit(1)
+
+    processes = os.cpu_count() or 1
+    if len(sys.argv) == 2:
+        with open(sys.argv[1], "r", encoding="utf-8") as input_file:
+            segment_names(input_file, sys.stdout, processes)
+    else:
+        segment_names(sys.stdin, sys.stdout, processes)
@@ -0,0 +1,270 @@
+import collections
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+from main import KNOWN_TERMS_PATH, TERM_INDEX_GLOB, load_known_terms
+from model import KnownTerm, KnownTermsDB
+from segment import annotate_name
+
+DEFAULT_PORT = 8000
+RELOAD_POLL_INTERVAL = 1.0  # seconds
+ENDPOINTS = ["annotate", "lookup", "metrics"]
+
+
+def _known_term_json(known_term: KnownTerm) -> dict[str, Any]:
+    return {
+        "native_names": known_term.native_name_dict,
+        "name_en": known_term.name_en,
+        "wikipedia_url": known_term.wikipedia_url or None,
+        "image_url": known_term.image_url or None,
+        "description_en": known_term.description_en or None,
+        "dish_cuisine_locale": known_term.dish_cuisine_locale or None,
+    }
+
+
+class Metrics:
+    """
+    Request counts, throughput and latency percentiles (over the most recent
+    requests), shared by all request handler threads.
+    """
+
+    def __init__(self, window: int = 10000):
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._latencies: collections.deque[float] = collections.deque(maxlen=window)
+        self.request_counter = collections.Counter()
+        self.status_counter = collections.Counter()
+        self.annotated_name_count = 0
+        self.lookup_name_count = 0
+        self.reload_count = 0
+
+    def record(
+        self,
+        endpoint: str,
+        status: int,
+        seconds: float,
+        annotated_name_count: int = 0,
+        lookup_name_count: int = 0,
+    ) -> None:
+        with self._lock:
+            self.request_counter[endpoint] += 1
+            self.status_counter[status] += 1
+            self.annotated_name_count += annotated_name_count
+            self.lookup_name_count += lookup_name_count
+            self._latencies.append(seconds)
+
+    def record_reload(self) -> None:
+        with self._lock:
+            self.reload_count += 1
+
+    def to_json(self) -> dict[str, Any]:
+        with self._lock:
+            uptime = time.monotonic() - self._started
+            latencies = sorted(self._latencies)
+            request_count = sum(self.request_counter.values())
+
+            def _percentile(p: float) -> float | None:
+                if not latencies:
+                    return None
+                i = min(len(latencies) - 1, int(p * len(latencies)))
+                return round(latencies[i] * 1000, 3)
+
+            return {
+                "uptime_seconds": round(uptime, 3),
+                "requests": dict(self.request_counter),
+                "requests_per_second": round(request_count / uptime, 3),
+                "responses_by_status": {
+                    str(status): count
+                    for status, count in sorted(self.status_counter.items())
+                },
+                "names_annotated": self.annotated_name_count,
+                "names_per_second": round(self.annotated_name_count / uptime, 3),
+                "names_looked_up": self.lookup_name_count,
+                "latency_ms": {
+                    "p50": _percentile(0.5),
+                    "p90": _percentile(0.9),
+                    "p99": _percentile(0.99),
+                    "max": _percentile(1.0),
+                },
+                "reloads": self.reload_count,
+            }
+
+
+class AnnotationService:
+    """
+    Keeps a KnownTermsDB in memory and rebuilds it when the known terms files
+    change. The new db is swapped in with a single assignment, so requests
+    already in progress finish against the db they started with.
+    """
+
+    def __init__(self):
+        self.metrics = Metrics()
+        self._file_mtimes = self._read_file_mtimes()
+        self.db: KnownTermsDB = load_known_terms()
+
+    def _read_file_mtimes(self) -> dict[str, float]:
+        paths = [KNOWN_TERMS_PATH] + sorted(glob.glob(TERM_INDEX_GLOB))
+        return {p: os.path.getmtime(p) for p in paths if os.path.exists(p)}
+
+    def watch(self) -> None:
+        pending_file_mtimes = None
+        while True:
+            time.sleep(RELOAD_POLL_INTERVAL)
+            file_mtimes = self._read_file_mtimes()
+            if file_mtimes == self._file_mtimes:
+                pending_file_mtimes = None
+            elif file_mtimes != pending_file_mtimes:
+                # Wait until the files stop changing, e.g. mid-save
+                pending_file_mtimes = file_mtimes
+            else:
+                self.reload(file_mtimes)
+                pending_file_mtimes = None
+
+    def reload(self, file_mtimes: dict[str, float]) -> None:
+        try:
+            db = load_known_terms()
+        except Exception as e:
+            # Keep serving the previous db until the files are fixed
+            print(f"ERROR: reloading known terms failed: {e!r}", file=sys.stderr)
+        else:
+            self.db = db
+            self.metrics.record_reload()
+            print(f"Reloaded known terms: {len(db.known_terms)} terms")
+        self._file_mtimes = file_mtimes
+
+
+def make_request_handler(service: AnnotationService) -> type[BaseHTTPRequestHandler]:
+    class RequestHandler(BaseHTTPRequestHandler):
+        # GET /lookup?name=..., GET /metrics,
+        # POST /annotate with {"name": ...} or {"names": [...]}
+
+        def log_message(self, format: str, *args: Any) -> None:
+            # Per-request logging is covered by /metrics
+            pass
+
+        def _send_json(
+            self,
+            status: int,
+            data: Any,
+            annotated_name_count: int = 0,
+            lookup_name_count: int = 0,
+        ) -> None:
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+            # Every response is recorded, errors included
+            service.metrics.record(
+                self._endpoint,
+                status,
+                time.perf_counter() - self._started,
+                annotated_name_count,
+                lookup_name_count,
+            )
+
+        def _start_request(self, path: str) -> None:
+            self._started = time.perf_counter()
+            # Unknown paths share one bucket, so clients can't grow the counter
+            endpoint = path.lstrip("/")
+            self._endpoint = endpoint if endpoint in ENDPOINTS else "other"
+
+        def do_GET(self) -> None:
+            url = urllib.parse.urlparse(self.path)
+            self._start_request(url.path)
+
+            if url.path == "/metrics":
+                self._send_json(200, service.metrics.to_json())
+                return
+
+            if url.path == "/lookup":
+                query = urllib.parse.parse_qs(url.query)
+                names = query.get("name", [])
+                if not names:
+                    self._send_json(400, {"error": "missing name parameter"})
+                    return
+
+                db = service.db
+                known_term = db.known_terms_lookup_dict.get(names[0])
+                if not known_term:
+                    for term_index in db.term_indexes:
+                        known_term = term_index.get(names[0])
+                        if known_term:
+                            break
+
+                if known_term:
+                    self._send_json(
+                        200, _known_term_json(known_term), lookup_name_count=1
+                    )
+                else:
+                    self._send_json(404, {"error": "unknown name"}, lookup_name_count=1)
+                return
+
+            self._send_json(404, {"error": "not found"})
+
+        def do_POST(self) -> None:
+            self._start_request(self.path)
+
+            if self.path != "/annotate":
+                self._send_json(404, {"error": "not found"})
+                return
+
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length))
+            except ValueError:
+                self._send_json(400, {"error": "invalid JSON"})
+                return
+
+            if not isinstance(request, dict):
+                self._send_json(400, {"error": "expected a JSON object"})
+                return
+
+            db = service.db
+            if isinstance(request.get("name"), str):
+                result = annotate_name(db, request["name"])
+                name_count = 1
+            elif isinstance(request.get("names"), list) and all(
+                [isinstance(name, str) for name in request["names"]]
+            ):
+                result = [annotate_name(db, name) for name in request["names"]]
+                name_count = len(result)
+            else:
+                self._send_json(400, {"error": "expected name or names"})
+                return
+
+            self._send_json(200, result, annotated_name_count=name_count)
+
+    return RequestHandler
+
+
+def serve(port: int) -> None:
+    service = AnnotationService()
+    threading.Thread(target=service.watch, daemon=True).start()
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_request_handler(service))
+    print(f"Serving annotations on http://127.0.0.1:{port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        print("Usage: python serve.py [port]", file=sys.stderr)
+        sys.exit(1)
+
+    port = int(sys.argv[1]) if len(sys.argv) == 2 else DEFAULT_PORT
+    serve(port)
@@ -1,9 +1,13 @@
 import collections
 import csv
-from collections import defaultdict
+import dataclasses
+import hashlib
+import json
+import os
 from typing import Any
 
 from model import KnownTermsDB
+from suggest import KnownTermSuggester, format_suggestions
 
 UNKNOWN_CHAR_PLACEHOLDER = "🟨"
 
@@ -16,20 +20,81 @@ def _generate_ngrams(text: str, n: int) -> list[str]:
     return ngrams
 
 
-def find_top_ngrams(
-    strings: list[str], n: int, top_n: int = 10
-) -> list[tuple[str, int]]:
-    ngram_counts = defaultdict(int)
-    for string in strings:
-        ngrams = _generate_ngrams(string, n)
-        for ngram in ngrams:
-            ngram_counts[ngram] += 1
-
-    # Get the top n-grams
-    sorted_ngrams = sorted(ngram_counts.items(), key=lambda x: x[1], reverse=True)
-    top_ngrams = sorted_ngrams[:top_n]
-
-    return top_ngrams
+def _name_ngram_counter(name: str, n: int) -> collections.Counter:
+    # N-grams of a primary name with non-alpha characters filtered out
+    ngram_counter = collections.Counter()
+    for word in "".join([c if c.isalpha() else " " for c in name]).split(" "):
+        ngram_counter.update(_generate_ngrams(word, n))
+    return ngram_counter
+
+
+def _most_common(counter: collections.Counter, top_n: int) -> list[tuple[str, int]]:
+    # Like Counter.most_common(), but ties are broken by key for stable output
+    return sorted(counter.items(), key=lambda x: (-x[1], x[0]))[:top_n]
+
+
+@dataclasses.dataclass
+class MenuStatsPartial:
+    """
+    Stats aggregates for a set of menus, combined in place with update().
+
+    primary_name_counter counts the number of menus each primary name is in,
+    and character_counter counts per menu (a name repeated within one menu
+    counts once). The n-gram counters count each unique name once, so they
+    are derived from the merged names rather than merged themselves.
+    """
+
+    menu_count: int = 0
+    primary_name_counter: collections.Counter = dataclasses.field(
+        default_factory=collections.Counter
+    )
+    character_counter: collections.Counter = dataclasses.field(
+        default_factory=collections.Counter
+    )
+
+    @classmethod
+    def from_primary_names(cls, primary_names: list[str]) -> "MenuStatsPartial":
+        partial = cls(menu_count=1)
+        for primary_name in set(primary_names):
+            partial.primary_name_counter[primary_name] += 1
+            partial.character_counter.update(
+                "".join([c for c in primary_name if c.isalpha()])
+            )
+        return partial
+
+    @classmethod
+    def from_json(cls, json_dict: dict[str, Any]) -> "MenuStatsPartial":
+        return cls(
+            menu_count=json_dict["menu_count"],
+            primary_name_counter=collections.Counter(json_dict["primary_name_counter"]),
+            character_counter=collections.Counter(json_dict["character_counter"]),
+        )
+
+    def to_json(self) -> dict[str, Any]:
+        # Not dataclasses.asdict(), which mangles Counter fields
+        return {
+            field.name: getattr(self, field.name) for field in dataclasses.fields(self)
+        }
+
+    def update(self, other: "MenuStatsPartial") -> None:
+        # In place, so folding N menus doesn't copy the running totals N times
+        self.menu_count += other.menu_count
+        self.primary_name_counter.update(other.primary_name_counter)
+        self.character_counter.update(other.character_counter)
+
+    def _ngram_counter(self, n: int) -> collections.Counter:
+        ngram_counter = collections.Counter()
+        for primary_name in self.primary_name_counter:
+            ngram_counter.update(_name_ngram_counter(primary_name, n))
+        return ngram_counter
+
+    @property
+    def bigram_counter(self) -> collections.Counter:
+        return self._ngram_counter(2)
+
+    @property
+    def trigram_counter(self) -> collections.Counter:
+        return self._ngram_counter(3)
 
 
 def load_eatsdb_names() -> list[str]:
@@ -76,31 +141,88 @@ def load_eatsdb_names() -> list[str]:
 #     return results
 
 
+def menu_primary_names(menu_yaml_dict: dict[str, Any]) -> list[str]:
+    # Unique menu item names in the menu's primary language, sorted
+    menu_primary_name_set = set()
+    if menu_yaml_dict.get("menu"):
+        menu = menu_yaml_dict["menu"]
+        primary_lang = menu["language_codes"][0]
+        for page in menu["pages"]:
+            if page.get("sections"):
+                for section in page["sections"]:
+                    if section.get("menu_items"):
+                        for menu_item in section["menu_items"]:
+                            name_lang = "name_" + primary_lang
+                            if menu_item.get(name_lang):
+                                primary_name = menu_item[name_lang]
+                                menu_primary_name_set.add(primary_name)
+    return sorted(menu_primary_name_set)
+
+
+def _partials_version() -> str:
+    # Any change to this module (how partials are built or serialized)
+    # invalidates all cached partials
+    with open(__file__, "r", encoding="utf-8") as f:
+        return hashlib.sha256(f.read().encode("utf-8")).hexdigest()
+
+
+def gather_menu_stats_partial(
+    menu_yaml_dicts: list[dict[str, Any]], partials_path: str | None = None
+) -> MenuStatsPartial:
+    # Reuse per-menu partials from the previous build where the names match
+    partials_version = _partials_version()
+    cached_partials = {}
+    if partials_path and os.path.exists(partials_path):
+        with open(partials_path, "r", encoding="utf-8") as f:
+            cache_json = json.load(f)
+        if cache_json.get("version") == partials_version:
+            cached_partials = cache_json["partials"]
+
+    # One partial per menu: menus with the same names (e.g. chain restaurants)
+    # share a cache entry, but each still counts
+    keyed_partials = []
+    for menu_yaml_dict in menu_yaml_dicts:
+        primary_names = menu_primary_names(menu_yaml_dict)
+        key = hashlib.sha256(
+            json.dumps(primary_names, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+
+        if key in cached_partials:
+            partial = MenuStatsPartial.from_json(cached_partials[key])
+        else:
+            partial = MenuStatsPartial.from_primary_names(primary_names)
+        keyed_partials.append((key, partial))
+
+    if partials_path:
+        os.makedirs(os.path.dirname(partials_path) or ".", exist_ok=True)
+        with open(partials_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": partials_version,
+                    "partials": {k: v.to_json() for k, v in keyed_partials},
+                },
+                f,
+                ensure_ascii=False,
+            )
+
+    stats_partial = MenuStatsPartial()
+    for _, partial in sorted(keyed_partials, key=lambda kp: kp[0]):
+        stats_partial.update(partial)
+    return stats_partial
+
+
 def gather_menu_stats(
-    menu_yaml_dicts: list[dict[str, Any]], db: KnownTermsDB
+    menu_yaml_dicts: list[dict[str, Any]],
+    db: KnownTermsDB,
+    partials_path: str | None = None,
 ) -> dict[str, Any]:
-    # Find dish names
-    menu_item_primary_names = []
-    for menu_yaml_dict in menu_yaml_dicts:
-        if menu_yaml_dict.get("menu"):
-            menu = menu_yaml_dict["menu"]
-            primary_lang = menu["language_codes"][0]
-            menu_primary_name_set = set()
-            for page in menu["pages"]:
-                if page.get("sections"):
-                    for section in page["sections"]:
-                        if section.get("menu_items"):
-                            for menu_item in section["menu_items"]:
-                                name_lang = "name_" + primary_lang
-                                if menu_item.get(name_lang):
-                                    primary_name = menu_item[name_lang]
-                                    menu_primary_name_set.add(primary_name)
-            menu_item_primary_names.extend(menu_primary_name_set)
+    stats_partial = gather_menu_stats_partial(menu_yaml_dicts, partials_path)
+
+    # Count per menu deduplicated
+    menu_item_primary_names = list(stats_partial.primary_name_counter.elements())
 
     # Find top alphabetic characters
-    character_counter = collections.Counter()
-    for primary_name in menu_item_primary_names:
-        character_counter.update("".join([c for c in primary_name if c.isalpha()]))
+    character_counter = stats_partial.character_counter
 
     def _enrich_counter_tuple_with_en(t: tuple) -> tuple:
         word, n = t
@@ -129,7 +251,7 @@ def gather_menu_stats(
     # Enrich tuples with English definitions
     top_characters_not_known = []
     top_character_tuples = []
-    for c, n in character_counter.most_common(350):
+    for c, n in _most_common(character_counter, 350):
         if c.isalpha():
             t = _enrich_counter_tuple_with_en((c, n))
             top_character_tuples.append(t)
@@ -137,15 +259,9 @@ def gather_menu_stats(
     if top_characters_not_known:
         print(f"Top characters not present in known_terms: {top_characters_not_known}")
 
-    # Get primary names with non-alpha characters filtered out
-    alpha_primary_names = []
-    for name in set(menu_item_primary_names):
-        name = "".join([c if c.isalpha() else " " for c in name])
-        alpha_primary_names.extend(name.split(" "))
-
     # Find top 2-grams
     top_2gram_tuples = []
-    for word, n in find_top_ngrams(alpha_primary_names, 2, 100):
+    for word, n in _most_common(stats_partial.bigram_counter, 100):
         # Filter out low-frequency results
         if n < 3:
             continue
@@ -154,7 +270,7 @@ def gather_menu_stats(
 
     # Find top 3-grams
     top_3gram_tuples = []
-    for word, n in find_top_ngrams(alpha_primary_names, 3, 100):
+    for word, n in _most_common(stats_partial.trigram_counter, 100):
         # Filter out low-frequency results
         if n < 3:
             continue
@@ -162,10 +278,10 @@ def gather_menu_stats(
         top_3gram_tuples.append(t)
 
     # Find common dishes
-    menu_item_primary_name_counter = collections.Counter(menu_item_primary_names)
+    menu_item_primary_name_counter = stats_partial.primary_name_counter
     filtered_c = {k: v for k, v in menu_item_primary_name_counter.items() if v >= 3}
     common_dishes = []
-    for k, v in sorted(filtered_c.items(), key=lambda x: x[1], reverse=True):
+    for k, v in _most_common(collections.Counter(filtered_c), len(filtered_c)):
         known_term = db.known_terms_lookup_dict.get(k)
         if known_term:
             en = known_term.name_en
@@ -175,11 +291,14 @@ def gather_menu_stats(
         common_dishes.append(t)
 
     # Data linting
+    suggester = KnownTermSuggester(db)
     for dish_name in filtered_c:
         if not dish_name in db.known_dish_lookup_dict.keys():
-            print(
-                f"WARNING: {dish_name} (count {menu_item_primary_name_counter[dish_name]}) is not in known_dishes"
-            )
+            warning = f"WARNING: {dish_name} (count {menu_item_primary_name_counter[dish_name]}) is not in known_dishes"
+            suggestions = suggester.suggest(dish_name)
+            if suggestions:
+                warning += f", did you mean: {format_suggestions(suggestions)}"
+            print(warning)
 
     eatsdb_names_set = set(load_eatsdb_names())
     for dish_name in menu_item_primary_names:
@@ -192,8 +311,8 @@ def gather_menu_stats(
             )
 
     return {
-        "menu_count": len(menu_yaml_dicts),
-        "unique_menu_item_count": len(set(menu_item_primary_names)),
+        "menu_count": stats_partial.menu_count,
+        "unique_menu_item_count": len(menu_item_primary_name_counter),
         "unique_character_count": len(character_counter),
         "top_characters": top_character_tuples,
         "top_2grams": top_2gram_tuples,
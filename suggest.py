@@ -0,0 +1,138 @@
+import collections
+import sys
+from typing import Iterable
+
+from model import KnownTerm, KnownTermsDB
+
+
+def levenshtein_distance(a: str, b: str) -> int:
+    # Classic dynamic programming, keeping only the previous row
+    if len(a) < len(b):
+        a, b = b, a
+    previous_row = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current_row = [i]
+        for j, cb in enumerate(b, 1):
+            current_row.append(
+                min(
+                    previous_row[j] + 1,  # deletion
+                    current_row[j - 1] + 1,  # insertion
+                    previous_row[j - 1] + (ca != cb),  # substitution
+                )
+            )
+        previous_row = current_row
+    return previous_row[-1]
+
+
+def _deletes(word: str, max_distance: int) -> set[str]:
+    # All strings obtained by deleting up to max_distance characters
+    deletes = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1 :] for w in frontier for i in range(len(w))}
+        deletes |= frontier
+    deletes.discard("")
+    return deletes
+
+
+class DeleteIndex:
+    """
+    Symmetric delete index for finding words within a small edit distance.
+
+    Every word is indexed under each string obtained by deleting up to
+    max_distance of its characters. Two words within edit distance k share
+    such a string, so a query only looks up its own deletes, and the work
+    per query depends on the query length rather than the number of words.
+    Candidates are then verified with levenshtein_distance().
+    """
+
+    def __init__(self, words: Iterable[str], max_distance: int = 1):
+        self.max_distance = max_distance
+        self._index: dict[str, list[str]] = collections.defaultdict(list)
+        for word in words:
+            for delete in _deletes(word, max_distance):
+                self._index[delete].append(word)
+
+    def search(self, word: str, max_distance: int) -> list[tuple[int, str]]:
+        assert max_distance <= self.max_distance
+
+        candidates = set()
+        for delete in _deletes(word, max_distance):
+            candidates.update(self._index.get(delete, []))
+
+        results = []
+        for candidate in candidates:
+            distance = levenshtein_distance(word, candidate)
+            if distance <= max_distance:
+                results.append((distance, candidate))
+        return sorted(results)
+
+
+class KnownTermSuggester:
+    """
+    Suggests known terms for unmatched menu item names, e.g. OCR typos or
+    simplified/traditional variants that differ by a character.
+    """
+
+    def __init__(self, db: KnownTermsDB, max_distance: int = 1):
+        self.db = db
+        self.index = DeleteIndex(db.known_terms_lookup_dict, max_distance)
+
+    def suggest(
+        self, name: str, max_distance: int = 1, top_n: int = 3
+    ) -> list[tuple[str, KnownTerm, int]]:
+        suggestions = []
+        for distance, native_name in self.index.search(name, max_distance):
+            if distance == 0:
+                continue
+            known_term = self.db.known_terms_lookup_dict[native_name]
+            suggestions.append((native_name, known_term, distance))
+
+        # Prefer closest, then dishes over terms
+        suggestions.sort(key=lambda s: (s[2], not s[1].dish_cuisine_locale, s[0]))
+        return suggestions[:top_n]
+
+
+def format_suggestions(suggestions: list[tuple[str, KnownTerm, int]]) -> str:
+    return ", ".join(
+        [
+            f'{native_name} "{known_term.name_en}" (distance {distance})'
+            for native_name, known_term, distance in suggestions
+        ]
+    )
+
+
+def print_suggestions_report(
+    menu_primary_name_counter: collections.Counter,
+    db: KnownTermsDB,
+    max_distance: int = 1,
+) -> None:
+    suggester = KnownTermSuggester(db, max_distance)
+
+    # Most common unmatched names first
+    for name, count in sorted(
+        menu_primary_name_counter.items(), key=lambda x: (-x[1], x[0])
+    ):
+        if name in db.known_dish_lookup_dict:
+            continue
+        suggestions = suggester.suggest(name, max_distance)
+        if suggestions:
+            print(f"{name} (count {count}): {format_suggestions(suggestions)}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3:
+        print("Usage: python suggest.py [input_dir] [max_distance]", file=sys.stderr)
+        sys.exit(1)
+
+    # Imported here as main imports stats, which imports this module
+    from main import INPUT_DIR, load_known_terms, load_menu_primary_name_counter
+
+    input_dir = sys.argv[1] if len(sys.argv) >= 2 else INPUT_DIR
+    max_distance = int(sys.argv[2]) if len(sys.argv) >= 3 else 1
+
+    db = load_known_terms()
+
+    menu_primary_name_counter = load_menu_primary_name_counter(input_dir)
+
+    print_suggestions_report(menu_primary_name_counter, db, max_distance)
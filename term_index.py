@@ -0,0 +1,194 @@
+import csv
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+from model import KnownTerm
+
+# File layout (all integers are little-endian uint32, offsets are absolute):
+#
+#   header        MAGIC, key_count, record_count, max_key_length (in chars),
+#                 columns_offset, columns_length, key_table_offset,
+#                 record_table_offset
+#   key table     key_count x (key_offset, key_length, record_id),
+#                 sorted by the UTF-8 bytes of the key
+#   record table  record_count x (record_offset, record_length)
+#   string pool   UTF-8 column header, keys and tab-joined TSV rows
+MAGIC = b"MDBTIDX1"
+HEADER_STRUCT = struct.Struct("<8s7I")
+KEY_STRUCT = struct.Struct("<3I")
+RECORD_STRUCT = struct.Struct("<2I")
+
+
+def _native_names(row: dict[str, str]) -> list[str]:
+    # Same as KnownTerm.all_native_names, without constructing a KnownTerm
+    native_names = []
+    for k, v in row.items():
+        if k.startswith("name_") and k != "name_en" and v:
+            native_names.extend([s.strip() for s in v.split(",") if s.strip()])
+    return native_names
+
+
+def compile_term_index(tsv_path: str, index_path: str) -> None:
+    with open(tsv_path, "r", encoding="utf-8") as csvfile:
+        csvreader = csv.DictReader(csvfile, delimiter="\t")
+        columns = list(csvreader.fieldnames or [])
+        rows = []
+        for row in csvreader:
+            assert any(row.values()), f"ERROR: {tsv_path} has empty lines"
+            rows.append(row)
+
+    # Map each native name to its row (later rows win, as in KnownTermsDB)
+    key_to_record_id = {}
+    for record_id, row in enumerate(rows):
+        for native_name in _native_names(row):
+            key_to_record_id[native_name.encode("utf-8")] = record_id
+    keys = sorted(key_to_record_id)
+    max_key_length = max([len(k.decode("utf-8")) for k in keys], default=0)
+
+    pool = bytearray()
+    pool_offset = (
+        HEADER_STRUCT.size
+        + len(keys) * KEY_STRUCT.size
+        + len(rows) * RECORD_STRUCT.size
+    )
+
+    def _append_to_pool(b: bytes) -> tuple[int, int]:
+        offset = pool_offset + len(pool)
+        pool.extend(b)
+        return offset, len(b)
+
+    columns_offset, columns_length = _append_to_pool("\t".join(columns).encode("utf-8"))
+
+    key_table = bytearray()
+    for key in keys:
+        offset, length = _append_to_pool(key)
+        key_table.extend(KEY_STRUCT.pack(offset, length, key_to_record_id[key]))
+
+    record_table = bytearray()
+    for row in rows:
+        record = "\t".join([row.get(c) or "" for c in columns])
+        record_table.extend(
+            RECORD_STRUCT.pack(*_append_to_pool(record.encode("utf-8")))
+        )
+
+    header = HEADER_STRUCT.pack(
+        MAGIC,
+        len(keys),
+        len(rows),
+        max_key_length,
+        columns_offset,
+        columns_length,
+        HEADER_STRUCT.size,
+        HEADER_STRUCT.size + len(key_table),
+    )
+    # Write a new file and rename it over the old one, never truncating a
+    # file that running processes may have mapped
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(index_path) or ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(key_table)
+            f.write(record_table)
+            f.write(pool)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, index_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+class TermIndex:
+    """
+    Read-only known terms dictionary compiled by compile_term_index().
+
+    The file is memory-mapped and queried in place, so opening it takes
+    constant time regardless of size, and processes opening the same file
+    share its pages. KnownTerm objects are only built for matched entries.
+    """
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        with open(index_path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (
+            magic,
+            self.key_count,
+            self.record_count,
+            self.max_key_length,
+            columns_offset,
+            columns_length,
+            self._key_table_offset,
+            self._record_table_offset,
+        ) = HEADER_STRUCT.unpack_from(self._mm, 0)
+        assert magic == MAGIC, f"ERROR: {index_path} is not a term index"
+
+        columns = self._mm[columns_offset : columns_offset + columns_length]
+        self.columns = columns.decode("utf-8").split("\t")
+
+        # Materialized KnownTerms, so that _menu_filenames accumulate
+        self._known_terms: dict[int, KnownTerm] = {}
+
+    def __len__(self) -> int:
+        return self.key_count
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def _key_entry(self, i: int) -> tuple[bytes, int]:
+        offset, length, record_id = KEY_STRUCT.unpack_from(
+            self._mm, self._key_table_offset + i * KEY_STRUCT.size
+        )
+        return self._mm[offset : offset + length], record_id
+
+    def _known_term(self, record_id: int) -> KnownTerm:
+        known_term = self._known_terms.get(record_id)
+        if not known_term:
+            offset, length = RECORD_STRUCT.unpack_from(
+                self._mm, self._record_table_offset + record_id * RECORD_STRUCT.size
+            )
+            values = self._mm[offset : offset + length].decode("utf-8").split("\t")
+            known_term = KnownTerm(dict(zip(self.columns, values)))
+            self._known_terms[record_id] = known_term
+        return known_term
+
+    def get(self, name: str) -> KnownTerm | None:
+        # Binary search over the sorted key table
+        target = name.encode("utf-8")
+        lo, hi = 0, self.key_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key, record_id = self._key_entry(mid)
+            if key == target:
+                return self._known_term(record_id)
+            elif key < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def match_prefix(
+        self, text: str, include_dishes: bool = True
+    ) -> tuple[str, KnownTerm] | None:
+        # Preferring longest possible match first
+        for length in range(min(len(text), self.max_key_length), 0, -1):
+            known_term = self.get(text[:length])
+            if known_term and (include_dishes or not known_term.dish_cuisine_locale):
+                return text[:length], known_term
+        return None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(
+            "Usage: python term_index.py <input_tsv> <output_termidx>", file=sys.stderr
+        )
+        sys.exit(1)
+
+    compile_term_index(sys.argv[1], sys.argv[2])
+    print(f"Compiled: {sys.argv[1]} -> {sys.argv[2]}")